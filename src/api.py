@@ -9,24 +9,39 @@ Features:
 - Prediction history (NEW!)
 """
 
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict
+from typing import List, Literal, Optional
 import pandas as pd
-import io
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import asyncio
+import csv
+import logging
+import multiprocessing
 import os
 import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 
 # Handle imports for both local run and Docker
 try:
-    from model import ChurnModel
+    from model import ChurnModel, get_risk_buckets, RISK_LEVELS, USE_TREELITE, MODEL_SUFFIX, TRAIN_THREADS
+    from model import init_batch_worker, predict_in_batch_worker
     from load_data import load_telco_data, prepare_data
-    from database import save_prediction, get_predictions, get_prediction_stats, delete_prediction, clear_history
+    from database import save_prediction, save_predictions_bulk, get_predictions, get_prediction_stats, delete_prediction, clear_history
 except ImportError:
-    from src.model import ChurnModel
+    from src.model import ChurnModel, get_risk_buckets, RISK_LEVELS, USE_TREELITE, MODEL_SUFFIX, TRAIN_THREADS
+    from src.model import init_batch_worker, predict_in_batch_worker
     from src.load_data import load_telco_data, prepare_data
-    from src.database import save_prediction, get_predictions, get_prediction_stats, delete_prediction, clear_history
+    from src.database import save_prediction, save_predictions_bulk, get_predictions, get_prediction_stats, delete_prediction, clear_history
+
+# Log level for the app and its modules (INFO in production)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
 
 # ============================================================
 # Global model instance (loaded from pre-trained file)
@@ -34,33 +49,165 @@ except ImportError:
 model: ChurnModel = None
 model_loading = False
 
+# /metrics response for the currently loaded model: (model, MetricsResponse)
+metrics_cache = None
+
+# /predict history writes are queued and flushed together in one
+# transaction: after HISTORY_FLUSH_SIZE records or HISTORY_FLUSH_INTERVAL seconds
+HISTORY_FLUSH_SIZE = 500
+HISTORY_FLUSH_INTERVAL = 0.05
+
+# Bytes read from the start of an upload to find its header line
+CSV_HEADER_PEEK_BYTES = 64 * 1024
+
+# Uploaded CSVs are read in ~1 MB blocks (roughly 10k rows per record batch)
+CSV_READ_OPTIONS = pacsv.ReadOptions(block_size=1 << 20)
+
+# Fixed types for every known CSV column (skips type inference; ids
+# stay strings, so leading zeros survive)
+CSV_SCHEMA = pa.schema([
+    ('customerID', pa.string()),
+    ('customer_id', pa.string()),
+    ('gender', pa.string()),
+    ('SeniorCitizen', pa.int64()),
+    ('Partner', pa.string()),
+    ('Dependents', pa.string()),
+    ('tenure', pa.int64()),
+    ('Contract', pa.string()),
+    ('PaperlessBilling', pa.string()),
+    ('PaymentMethod', pa.string()),
+    ('InternetService', pa.string()),
+    ('OnlineSecurity', pa.string()),
+    ('TechSupport', pa.string()),
+    ('MonthlyCharges', pa.float64()),
+    ('TotalCharges', pa.float64())
+])
+CSV_CONVERT_OPTIONS = pacsv.ConvertOptions(
+    column_types={field.name: field.type for field in CSV_SCHEMA}
+)
+
+# Record batches being scored at once (caps memory for large uploads)
+MAX_BATCHES_IN_FLIGHT = 2
+
+# Worker processes for /predict/batch scoring (0 = score in threads).
+# Only pays off for very large uploads, where pandas holds the GIL.
+BATCH_PROCESSES = int(os.environ.get("BATCH_PROCESSES", "0"))
+batch_pool: Optional[ProcessPoolExecutor] = None
+
+# XGBoost threads for scoring batches of 1000+ rows in this process.
+# nthread ignores OMP_NUM_THREADS, so the default splits the CPUs between
+# the WEB_CONCURRENCY server workers (unset: uvicorn runs one) instead of
+# starting workers x CPUs threads; 1 turns the threaded path off
+BATCH_THREADS = int(os.environ.get(
+    "BATCH_THREADS", max(1, TRAIN_THREADS // max(1, int(os.environ.get("WEB_CONCURRENCY", "1"))))
+))
+
 
 def init_model():
     """Load pre-trained model from file."""
-    global model, model_loading
+    global model, model_loading, batch_pool
     import os
     model_loading = True
-    print("Initializing ChurnShield AI v2.2...")
+    logger.info("Initializing ChurnShield AI v2.2...")
 
-    # Find model file path
-    model_path = os.path.join(os.path.dirname(__file__), "churn_model.joblib")
+    # Find model file path (native XGBoost file, else an older joblib pickle)
+    model_base = os.path.join(os.path.dirname(__file__), "churn_model")
+    lib_path = model_base + ".so"
+    if os.path.exists(model_base + MODEL_SUFFIX):
+        model_path, model_file = model_base, model_base + MODEL_SUFFIX
+    else:
+        model_path = model_file = model_base + ".joblib"
 
-    if os.path.exists(model_path):
-        print(f"Loading pre-trained model from {model_path}...")
-        model = ChurnModel()
+    if os.path.exists(model_file):
+        logger.info("Loading pre-trained model from %s...", model_file)
+        model = ChurnModel(batch_threads=BATCH_THREADS)
         model.load(model_path)
-        print(f"Model loaded! Accuracy: {model.metrics.get('accuracy', 0)}%")
+        logger.info("Model loaded! Accuracy: %s%%", model.metrics.get('accuracy', 0))
     else:
-        print(f"WARNING: Model file not found at {model_path}")
-        print("Training model from scratch...")
-        model = ChurnModel()
+        logger.warning("Model file not found at %s%s", model_base, MODEL_SUFFIX)
+        logger.info("Training model from scratch...")
+        model = ChurnModel(batch_threads=BATCH_THREADS)
         raw_data = load_telco_data()
         training_data = prepare_data(raw_data)
         model.train(training_data)
-        print("Model trained!")
+        logger.info("Model trained!")
+
+    if USE_TREELITE:
+        # Recompile when the library is missing or older than the model file
+        rebuild = (
+            not os.path.exists(model_file)
+            or (os.path.exists(lib_path) and os.path.getmtime(lib_path) < os.path.getmtime(model_file))
+        )
+        logger.info("Using Treelite compiled predictor (%s)", lib_path)
+        model.enable_treelite(lib_path, rebuild=rebuild)
+
+    if BATCH_PROCESSES > 0 and os.path.exists(model_file):
+        logger.info("Starting %d batch worker processes...", BATCH_PROCESSES)
+        # Spawn rather than fork: the parent already has OpenMP, the event
+        # loop and the history writer running, and libgomp is not fork-safe.
+        # Workers load the model themselves in init_batch_worker, which
+        # lives in model.py so they never import this module.
+        batch_pool = ProcessPoolExecutor(
+            max_workers=BATCH_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_batch_worker,
+            initargs=(model_path, lib_path if USE_TREELITE else None)
+        )
 
     model_loading = False
-    print("Model ready!")
+    logger.info("Model ready!")
+
+
+async def _history_writer(queue: asyncio.Queue):
+    """Drain queued /predict history records into SQLite in bulk."""
+    loop = asyncio.get_running_loop()
+    while True:
+        records = [await queue.get()]
+        deadline = loop.time() + HISTORY_FLUSH_INTERVAL
+
+        while len(records) < HISTORY_FLUSH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                records.append(await asyncio.wait_for(queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+
+        try:
+            await asyncio.to_thread(save_predictions_bulk, records)
+        except Exception as e:
+            logger.warning("Failed to save %d predictions to history: %s", len(records), e)
+        finally:
+            for _ in records:
+                queue.task_done()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup: load the model in a background thread (skipped during tests)
+    and start the task that batches /predict history writes. Runs in
+    every worker process, so each worker loads its own model.
+
+    Shutdown: write any queued history records, then stop the batch
+    worker processes, if any.
+    """
+    if os.environ.get("TESTING") != "1":
+        threading.Thread(target=init_model, daemon=True).start()
+
+    queue = app.state.history_queue = asyncio.Queue()
+    writer = asyncio.create_task(_history_writer(queue))
+    try:
+        yield
+    finally:
+        await queue.join()
+        writer.cancel()
+        # /predict falls back to writing directly once the writer is gone
+        app.state.history_queue = None
+
+        if batch_pool is not None:
+            batch_pool.shutdown(cancel_futures=True)
 
 
 # ============================================================
@@ -70,12 +217,11 @@ def init_model():
 app = FastAPI(
     title="ChurnShield AI",
     description="Predict customer churn using XGBoost ML - With batch predictions & history!",
-    version="2.2.0"
+    version="2.2.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
-# Start model initialization in background thread (skip during tests)
-if os.environ.get("TESTING") != "1":
-    threading.Thread(target=init_model, daemon=True).start()
 
 # CORS middleware
 app.add_middleware(
@@ -91,19 +237,35 @@ app.add_middleware(
 # ============================================================
 
 
+# Category values the model was trained on (Telco dataset spelling)
+YesNo = Literal["Yes", "No"]
+InternetAddOn = Literal["Yes", "No", "No internet service"]
+
+
 class CustomerInput(BaseModel):
-    """Single customer input for prediction."""
-    gender: str = "Male"
+    """
+    Single customer input for prediction.
+    Unknown category values are rejected with a 422 by pydantic's
+    validator, before the handler runs.
+    """
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
+    gender: Literal["Male", "Female"] = "Male"
     SeniorCitizen: int = 0
-    Partner: str = "No"
-    Dependents: str = "No"
+    Partner: YesNo = "No"
+    Dependents: YesNo = "No"
     tenure: int
-    Contract: str
-    PaperlessBilling: str = "Yes"
-    PaymentMethod: str
-    InternetService: str = "Fiber optic"
-    OnlineSecurity: str = "No"
-    TechSupport: str = "No"
+    Contract: Literal["Month-to-month", "One year", "Two year"]
+    PaperlessBilling: YesNo = "Yes"
+    PaymentMethod: Literal[
+        "Electronic check",
+        "Mailed check",
+        "Bank transfer (automatic)",
+        "Credit card (automatic)"
+    ]
+    InternetService: Literal["DSL", "Fiber optic", "No"] = "Fiber optic"
+    OnlineSecurity: InternetAddOn = "No"
+    TechSupport: InternetAddOn = "No"
     MonthlyCharges: float
     TotalCharges: float
 
@@ -173,8 +335,15 @@ class HistoryStatsResponse(BaseModel):
 # ============================================================
 
 
+async def get_model() -> ChurnModel:
+    """The loaded model, or 503 while it is missing or still training."""
+    if model is None or not model.is_trained:
+        raise HTTPException(status_code=503, detail="Model not trained")
+    return model
+
+
 @app.get("/")
-def root():
+async def root():
     """Root endpoint - API info."""
     return {
         "message": "Welcome to ChurnShield AI!",
@@ -184,16 +353,18 @@ def root():
         "endpoints": {
             "predict": "/predict (POST) - Single customer",
             "batch": "/predict/batch (POST) - CSV upload",
+            "batch_json": "/predict/batch/json (POST) - JSON list of customers",
             "metrics": "/metrics (GET) - Model performance",
             "history": "/history (GET) - Prediction history",
             "stats": "/history/stats (GET) - History statistics",
+            "cache": "/cache/clear (POST) - Clear prediction cache",
             "docs": "/docs - API documentation"
         }
     }
 
 
 @app.get("/health")
-def health_check():
+async def health_check():
     """Health check with model status."""
     if model is None:
         return {
@@ -211,45 +382,196 @@ def health_check():
 
 
 @app.get("/metrics", response_model=MetricsResponse)
-def get_metrics():
-    """Get model performance metrics and feature importance."""
-    if model is None or not model.is_trained:
-        raise HTTPException(status_code=503, detail="Model not trained")
+async def get_metrics(response: Response, churn_model: ChurnModel = Depends(get_model)):
+    """
+    Get model performance metrics and feature importance.
+    Built once per loaded model; clients may cache it for a minute.
+    """
+    global metrics_cache
+    if metrics_cache is None or metrics_cache[0] is not churn_model:
+        metrics_cache = (churn_model, MetricsResponse(
+            accuracy=churn_model.metrics.get('accuracy', 0),
+            train_samples=churn_model.metrics.get('train_samples', 0),
+            test_samples=churn_model.metrics.get('test_samples', 0),
+            total_samples=churn_model.metrics.get('total_samples', 0),
+            feature_importance=churn_model.get_feature_importance()
+        ))
 
-    return MetricsResponse(
-        accuracy=model.metrics.get('accuracy', 0),
-        train_samples=model.metrics.get('train_samples', 0),
-        test_samples=model.metrics.get('test_samples', 0),
-        total_samples=model.metrics.get('total_samples', 0),
-        feature_importance=model.get_feature_importance()
-    )
+    response.headers["Cache-Control"] = "max-age=60"
+    return metrics_cache[1]
 
 
 @app.post("/predict", response_model=PredictionResponse)
-def predict_churn(customer: CustomerInput):
+async def predict_churn(customer: CustomerInput, churn_model: ChurnModel = Depends(get_model)):
     """Predict churn for a single customer."""
-    if model is None or not model.is_trained:
-        raise HTTPException(status_code=503, detail="Model not trained")
-
     try:
-        customer_data = customer.model_dump()
-        result = model.predict(customer_data)
-
-        # Save to history
-        save_prediction(
-            customer_data=customer_data,
-            churn_probability=result['churn_probability'],
-            risk_level=result['risk_level'],
-            will_churn=result['will_churn'],
-            prediction_type='single'
-        )
+        # Read the validated fields straight into feature order (no model_dump)
+        values = tuple(getattr(customer, name) for name in churn_model.feature_names)
+        result = await asyncio.to_thread(churn_model.predict_values, values)
+
+        # Save to history - queued for the background writer, so the
+        # response does not wait for the SQLite commit
+        record = {
+            'customer_data': dict(zip(churn_model.feature_names, values)),
+            'churn_probability': result['churn_probability'],
+            'risk_level': result['risk_level'],
+            'will_churn': result['will_churn'],
+            'prediction_type': 'single'
+        }
+        queue = getattr(app.state, "history_queue", None)
+        if queue is not None:
+            queue.put_nowait(record)
+        else:
+            # Writer not running (app used without its lifespan)
+            await asyncio.to_thread(save_prediction, **record)
 
         return PredictionResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Prediction failed: {str(e)}")
 
 
-@app.post("/predict/batch", response_model=BatchPredictionResponse)
+# Required CSV columns (others fall back to the CustomerInput defaults)
+REQUIRED_CSV_COLUMNS = ['tenure', 'Contract', 'PaymentMethod', 'MonthlyCharges', 'TotalCharges']
+
+# Default values for optional CSV columns
+CSV_DEFAULTS = {
+    'gender': 'Male',
+    'SeniorCitizen': 0,
+    'Partner': 'No',
+    'Dependents': 'No',
+    'PaperlessBilling': 'Yes',
+    'InternetService': 'Fiber optic',
+    'OnlineSecurity': 'No',
+    'TechSupport': 'No'
+}
+
+
+def _read_next_batch(reader):
+    """Next record batch from a streaming CSV reader, or None at the end."""
+    try:
+        return reader.read_next_batch()
+    except StopIteration:
+        return None
+
+
+def _score_record_batch(batch: pa.RecordBatch, id_column: Optional[str], row_offset: int,
+                        cancelled: threading.Event):
+    """
+    Predict one record batch of an uploaded CSV (blocking).
+
+    Returns (customer_data_records, customer_ids, probabilities), or None
+    if the upload failed (cancelled set) before this batch was scored.
+    """
+    if cancelled.is_set():
+        return None
+    # One pandas block per column (no consolidation copy into 2-D blocks)
+    df = pa.Table.from_batches([batch]).to_pandas(split_blocks=True)
+
+    for col, default_val in CSV_DEFAULTS.items():
+        if col not in df.columns:
+            df[col] = default_val
+
+    # Cast dtypes once for the whole frame (int()/float() per row before)
+    features = df[list(model.feature_names)].astype({
+        'SeniorCitizen': 'int64',
+        'tenure': 'int64',
+        'MonthlyCharges': 'float64',
+        'TotalCharges': 'float64'
+    })
+
+    if id_column:
+        customer_ids = df[id_column].astype(str).tolist()
+    else:
+        customer_ids = [f"row_{row_offset + idx}" for idx in range(len(df))]
+
+    if cancelled.is_set():
+        return None
+
+    if batch_pool is not None:
+        probabilities = batch_pool.submit(predict_in_batch_worker, features).result()
+    else:
+        probabilities = model.predict_batch(features)
+
+    # History dicts built here, off the event loop; itertuples yields plain
+    # Python scalars without building a Series per row
+    columns = list(features.columns)
+    customer_data_records = [
+        dict(zip(columns, row)) for row in features.itertuples(index=False, name=None)
+    ]
+
+    return customer_data_records, customer_ids, probabilities
+
+
+async def _batch_response(customer_data_records: List[dict], customer_ids: List[str],
+                          probabilities: np.ndarray) -> ORJSONResponse:
+    """
+    Build the /predict/batch response from one probability array and save
+    every prediction to history in a single transaction.
+
+    Returned as an ORJSONResponse: FastAPI sends it as-is instead of
+    walking every prediction dict through jsonable_encoder first.
+    """
+    churn_probabilities = np.round(probabilities * 100, 2)
+    risk_buckets = get_risk_buckets(probabilities)
+    risk_levels = RISK_LEVELS[risk_buckets]
+    will_churn = probabilities >= 0.5
+
+    # Low/Medium/High/Critical counts in one pass over the bucket indices
+    risk_counts = dict(zip(
+        RISK_LEVELS.tolist(),
+        np.bincount(risk_buckets, minlength=len(RISK_LEVELS)).tolist()
+    ))
+
+    # One comprehension over plain Python lists (tolist converts in C)
+    predictions = [
+        {
+            'customer_id': customer_id_str,
+            'churn_probability': probability,
+            'risk_level': risk_level,
+            'will_churn': churn
+        }
+        for customer_id_str, probability, risk_level, churn in zip(
+            customer_ids,
+            churn_probabilities.tolist(),
+            risk_levels.tolist(),
+            will_churn.tolist()
+        )
+    ]
+    history_records = [
+        {**prediction, 'customer_data': customer_data, 'prediction_type': 'batch'}
+        for prediction, customer_data in zip(predictions, customer_data_records)
+    ]
+
+    # Save to history - one transaction once every batch has been scored
+    await asyncio.to_thread(save_predictions_bulk, history_records)
+
+    # Calculate summary statistics (NumPy reductions)
+    total = len(predictions)
+    churn_count = int(will_churn.sum())
+    avg_probability = float(churn_probabilities.mean()) if total > 0 else 0
+
+    summary = {
+        'total_customers': total,
+        'predicted_churners': churn_count,
+        'churn_rate': round(churn_count / total * 100, 2) if total > 0 else 0,
+        'average_churn_probability': round(avg_probability, 2),
+        'risk_distribution': risk_counts
+    }
+
+    return ORJSONResponse({
+        'total_customers': total,
+        'predictions': predictions,
+        'summary': summary
+    })
+
+
+# Documented schema only: validating every BatchPredictionItem on the way
+# out dominates the response time for large uploads
+@app.post(
+    "/predict/batch",
+    responses={200: {"model": BatchPredictionResponse}},
+    dependencies=[Depends(get_model)]
+)
 async def predict_batch(file: UploadFile = File(...)):
     """
     Batch prediction - Upload a CSV file with customer data.
@@ -259,135 +581,156 @@ async def predict_batch(file: UploadFile = File(...)):
     OnlineSecurity, TechSupport, MonthlyCharges, TotalCharges
 
     Optional: customerID column for tracking
-    """
-    if model is None or not model.is_trained:
-        raise HTTPException(status_code=503, detail="Model not trained")
 
+    The upload is parsed as a stream of record batches; reading the next
+    batch overlaps with scoring the previous ones.
+    """
     # Check file type
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files are supported")
 
     try:
-        # Read CSV content
-        content = await file.read()
-        df = pd.read_csv(io.StringIO(content.decode('utf-8')))
-
-        # Check for customer ID column
-        has_customer_id = 'customerID' in df.columns or 'customer_id' in df.columns
-        id_column = 'customerID' if 'customerID' in df.columns else 'customer_id' if 'customer_id' in df.columns else None
-
-        # Required columns (excluding optional ones with defaults)
-        required_cols = ['tenure', 'Contract', 'PaymentMethod', 'MonthlyCharges', 'TotalCharges']
-        missing_cols = [col for col in required_cols if col not in df.columns]
+        # Check the header line before handing the file to the parser, so
+        # uploads without the required columns are rejected without reading on
+        head = await file.read(CSV_HEADER_PEEK_BYTES)
+        if not head:
+            raise HTTPException(status_code=400, detail="CSV file is empty")
+        header_line = head.split(b"\n", 1)[0].decode("utf-8-sig", errors="replace").rstrip("\r")
+        columns = next(csv.reader([header_line]), [])
+
+        missing_cols = [col for col in REQUIRED_CSV_COLUMNS if col not in columns]
         if missing_cols:
             raise HTTPException(
                 status_code=400,
                 detail=f"Missing required columns: {missing_cols}"
             )
+        await file.seek(0)
 
-        # Default values for optional columns
-        defaults = {
-            'gender': 'Male',
-            'SeniorCitizen': 0,
-            'Partner': 'No',
-            'Dependents': 'No',
-            'PaperlessBilling': 'Yes',
-            'InternetService': 'Fiber optic',
-            'OnlineSecurity': 'No',
-            'TechSupport': 'No'
-        }
-
-        for col, default_val in defaults.items():
-            if col not in df.columns:
-                df[col] = default_val
-
-        # Make predictions
-        predictions = []
-        risk_counts = {'Low': 0, 'Medium': 0, 'High': 0, 'Critical': 0}
-
-        for idx, row in df.iterrows():
-            customer_data = {
-                'gender': row.get('gender', 'Male'),
-                'SeniorCitizen': int(row.get('SeniorCitizen', 0)),
-                'Partner': row.get('Partner', 'No'),
-                'Dependents': row.get('Dependents', 'No'),
-                'tenure': int(row['tenure']),
-                'Contract': row['Contract'],
-                'PaperlessBilling': row.get('PaperlessBilling', 'Yes'),
-                'PaymentMethod': row['PaymentMethod'],
-                'InternetService': row.get('InternetService', 'Fiber optic'),
-                'OnlineSecurity': row.get('OnlineSecurity', 'No'),
-                'TechSupport': row.get('TechSupport', 'No'),
-                'MonthlyCharges': float(row['MonthlyCharges']),
-                'TotalCharges': float(row['TotalCharges'])
-            }
-
-            result = model.predict(customer_data)
-            risk_counts[result['risk_level']] += 1
-
-            customer_id_str = str(row[id_column]) if id_column else f"row_{idx}"
-
-            # Save to history
-            save_prediction(
-                customer_data=customer_data,
-                churn_probability=result['churn_probability'],
-                risk_level=result['risk_level'],
-                will_churn=result['will_churn'],
-                customer_id=customer_id_str,
-                prediction_type='batch'
-            )
+        # Check for customer ID column
+        id_column = 'customerID' if 'customerID' in columns else 'customer_id' if 'customer_id' in columns else None
 
-            predictions.append(BatchPredictionItem(
-                customer_id=customer_id_str,
-                churn_probability=result['churn_probability'],
-                risk_level=result['risk_level'],
-                will_churn=result['will_churn']
-            ))
-
-        # Calculate summary statistics
-        total = len(predictions)
-        churn_count = sum(1 for p in predictions if p.will_churn)
-        avg_probability = sum(p.churn_probability for p in predictions) / total if total > 0 else 0
-
-        summary = {
-            'total_customers': total,
-            'predicted_churners': churn_count,
-            'churn_rate': round(churn_count / total * 100, 2) if total > 0 else 0,
-            'average_churn_probability': round(avg_probability, 2),
-            'risk_distribution': risk_counts
-        }
+        # Stream the spooled upload instead of loading it into memory
+        reader = await asyncio.to_thread(
+            pacsv.open_csv, file.file,
+            read_options=CSV_READ_OPTIONS,
+            convert_options=CSV_CONVERT_OPTIONS
+        )
 
-        return BatchPredictionResponse(
-            total_customers=total,
-            predictions=predictions,
-            summary=summary
+        # Make predictions - read -> predict pipeline, bounded in memory
+        # (enough batches in flight to keep every worker process busy)
+        in_flight = asyncio.Semaphore(max(MAX_BATCHES_IN_FLIGHT, BATCH_PROCESSES))
+        cancelled = threading.Event()
+
+        async def score(batch, row_offset):
+            try:
+                return await asyncio.to_thread(_score_record_batch, batch, id_column, row_offset, cancelled)
+            finally:
+                in_flight.release()
+
+        tasks = []
+        row_offset = 0
+        try:
+            while True:
+                await in_flight.acquire()
+                batch = await asyncio.to_thread(_read_next_batch, reader)
+                if batch is None:
+                    in_flight.release()
+                    break
+                tasks.append(asyncio.create_task(score(batch, row_offset)))
+                row_offset += batch.num_rows
+
+            results = await asyncio.gather(*tasks)
+        finally:
+            # On a bad block (or a failed batch) cancel the scoring tasks so
+            # none is left unawaited. Cancelling does not stop a to_thread
+            # call, so the flag makes threads that have not started
+            # predicting skip the batch; one already predicting (or its
+            # pool job) still runs to the end in the background
+            cancelled.set()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        customer_data_records = []
+        customer_ids = []
+        for batch_records, batch_ids, _ in results:
+            customer_data_records.extend(batch_records)
+            customer_ids.extend(batch_ids)
+        probabilities = (
+            np.concatenate([batch_probabilities for _, _, batch_probabilities in results])
+            if results else np.empty(0, dtype=np.float32)
         )
 
-    except pd.errors.EmptyDataError:
-        raise HTTPException(status_code=400, detail="CSV file is empty")
+        return await _batch_response(customer_data_records, customer_ids, probabilities)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing file: {str(e)}")
 
 
+@app.post("/predict/batch/json", responses={200: {"model": BatchPredictionResponse}})
+async def predict_batch_json(customers: List[CustomerInput], churn_model: ChurnModel = Depends(get_model)):
+    """
+    Batch prediction - JSON list of customers (same fields as /predict).
+
+    All customers are scored with one model call; same response as
+    /predict/batch, with customer ids row_0, row_1, ...
+    """
+    try:
+        feature_names = churn_model.feature_names
+        customer_data_records = [
+            {name: getattr(customer, name) for name in feature_names}
+            for customer in customers
+        ]
+        customer_ids = [f"row_{idx}" for idx in range(len(customers))]
+        probabilities = await asyncio.to_thread(churn_model.predict_batch, customer_data_records)
+
+        return await _batch_response(customer_data_records, customer_ids, probabilities)
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Prediction failed: {str(e)}")
+
+
+@app.post("/cache/clear")
+async def clear_prediction_cache():
+    """Clear the in-memory cache of single predictions."""
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not trained")
+
+    model.clear_cache()
+    return {"message": "Prediction cache cleared"}
+
+
 # ============================================================
 # History Endpoints
 # ============================================================
 
 
-@app.get("/history", response_model=HistoryResponse)
-def get_history(limit: int = 50, offset: int = 0):
-    """Get prediction history with pagination."""
-    predictions = get_predictions(limit=limit, offset=offset)
-    return HistoryResponse(
-        predictions=predictions,
-        total=len(predictions)
-    )
+# Documented schema only: the rows are already plain dicts from SQLite,
+# so re-validating them with response_model would just cost time
+@app.get("/history", responses={200: {"model": HistoryResponse}})
+async def get_history(limit: int = 50, offset: int = 0, before_id: Optional[int] = None):
+    """
+    Get prediction history with pagination.
+
+    For deep pages pass before_id (the id of the last item already seen)
+    instead of a large offset; offset is ignored when before_id is given.
+    """
+    predictions = await asyncio.to_thread(get_predictions, limit, offset, before_id)
+    if predictions is None:
+        raise HTTPException(status_code=404, detail="Prediction not found")
+    # Sent as-is (no jsonable_encoder pass over every history item)
+    return ORJSONResponse({
+        "predictions": predictions,
+        "total": len(predictions)
+    })
 
 
 @app.get("/history/stats", response_model=HistoryStatsResponse)
-def get_history_stats():
+async def get_history_stats():
     """Get prediction history statistics."""
-    stats = get_prediction_stats()
+    stats = await asyncio.to_thread(get_prediction_stats)
     return HistoryStatsResponse(**stats)
 
 
@@ -412,4 +755,20 @@ def clear_all_history():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+
+    # Many single-threaded workers beat one worker with many XGBoost threads
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    # Exported so each worker's BATCH_THREADS default sees the worker count
+    os.environ.setdefault("WEB_CONCURRENCY", str(os.cpu_count() or 1))
+    workers = int(os.environ["WEB_CONCURRENCY"])
+
+    uvicorn.run(
+        "api:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host="0.0.0.0",
+        port=8000,
+        workers=workers,
+        # libuv event loop and the C HTTP parser (uvloop has no Windows build)
+        loop="asyncio" if os.name == "nt" else "uvloop",
+        http="httptools"
+    )
@@ -6,27 +6,72 @@ Stores prediction history for analytics and tracking.
 """
 
 import sqlite3
-import json
+import orjson
+import logging
+import threading
+import weakref
+from contextlib import contextmanager
 from datetime import datetime
 from typing import List, Optional
 import os
 
+logger = logging.getLogger(__name__)
+
 # Database file path
 DB_PATH = os.environ.get('DATABASE_PATH', 'predictions.db')
 
+# One cached connection per thread (FastAPI runs sync work in a threadpool)
+_local = threading.local()
+
 
 def get_connection():
-    """Get database connection with row factory."""
-    conn = sqlite3.connect(DB_PATH)
+    """
+    Get this thread's database connection (opened on first use).
+
+    The connection is in autocommit mode (isolation_level=None), so
+    multi-statement writes use _transaction() explicitly.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        return conn
+
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
     conn.row_factory = sqlite3.Row
+
+    # Per-connection tuning (journal_mode=WAL is persisted by init_db)
+    conn.execute('PRAGMA synchronous=NORMAL')   # WAL + NORMAL: fsync at checkpoints only
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-65536')    # 64 MB page cache
+    conn.execute('PRAGMA mmap_size=268435456')  # 256 MB memory-mapped reads
+
+    _local.conn = conn
+    # Close it once the thread is gone (the threadpool retires idle
+    # threads), or at interpreter exit for threads still running
+    weakref.finalize(threading.current_thread(), conn.close)
     return conn
 
 
+@contextmanager
+def _transaction(conn):
+    """Run the enclosed statements in one explicit transaction."""
+    conn.execute('BEGIN')
+    try:
+        yield conn
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
 def init_db():
     """Initialize database tables."""
     conn = get_connection()
     cursor = conn.cursor()
 
+    # WAL lets /history reads run while predictions are being written.
+    # The journal mode is stored in the database file, so set it once here.
+    cursor.execute('PRAGMA journal_mode=WAL')
+
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS predictions (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -40,9 +85,17 @@ def init_db():
         )
     ''')
 
-    conn.commit()
-    conn.close()
-    print("Database initialized")
+    # Newest-first index: serves /history pages in index order (no sort)
+    # and the date-range scan of the recent trend query
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS ix_pred_created_desc
+        ON predictions(created_at DESC, id DESC)
+    ''')
+
+    # Refresh planner statistics when they are stale (cheap no-op otherwise)
+    cursor.execute('PRAGMA optimize')
+
+    logger.info("Database initialized")
 
 
 def save_prediction(
@@ -67,7 +120,7 @@ def save_prediction(
         VALUES (?, ?, ?, ?, ?, ?)
     ''', (
         customer_id,
-        json.dumps(customer_data),
+        orjson.dumps(customer_data).decode(),
         churn_probability,
         risk_level,
         1 if will_churn else 0,
@@ -75,32 +128,79 @@ def save_prediction(
     ))
 
     prediction_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
 
     return prediction_id
 
 
-def get_predictions(limit: int = 50, offset: int = 0) -> List[dict]:
-    """Get prediction history with pagination."""
+def save_predictions_bulk(records: List[dict]) -> int:
+    """
+    Save many predictions to history in a single transaction.
+
+    Each record has the same keys as save_prediction's arguments.
+    Returns the number of saved predictions.
+    """
+    rows = [
+        (
+            record.get('customer_id'),
+            orjson.dumps(record['customer_data']).decode(),
+            record['churn_probability'],
+            record['risk_level'],
+            1 if record['will_churn'] else 0,
+            record.get('prediction_type', 'single')
+        )
+        for record in records
+    ]
+
+    conn = get_connection()
+
+    with _transaction(conn):
+        conn.executemany('''
+            INSERT INTO predictions
+            (customer_id, customer_data, churn_probability, risk_level, will_churn, prediction_type)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+    return len(rows)
+
+
+def get_predictions(limit: int = 50, offset: int = 0, before_id: Optional[int] = None) -> Optional[List[dict]]:
+    """
+    Get prediction history with pagination, newest first.
+
+    Pass the id of the last item of a page as before_id to get the next
+    page (keyset pagination); unlike a large OFFSET it does not need to
+    skip over the earlier rows, and offset is ignored. Returns None when
+    no prediction has id before_id.
+    """
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute('''
-        SELECT * FROM predictions
-        ORDER BY created_at DESC
-        LIMIT ? OFFSET ?
-    ''', (limit, offset))
+    if before_id is None:
+        cursor.execute('''
+            SELECT * FROM predictions
+            ORDER BY created_at DESC, id DESC
+            LIMIT ? OFFSET ?
+        ''', (limit, offset))
+    else:
+        cursor.execute('SELECT created_at FROM predictions WHERE id = ?', (before_id,))
+        anchor = cursor.fetchone()
+        if anchor is None:
+            return None
+        cursor.execute('''
+            SELECT * FROM predictions
+            WHERE (created_at, id) < (?, ?)
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ''', (anchor['created_at'], before_id, limit))
 
     rows = cursor.fetchall()
-    conn.close()
 
     predictions = []
     for row in rows:
         predictions.append({
             'id': row['id'],
             'customer_id': row['customer_id'],
-            'customer_data': json.loads(row['customer_data']),
+            'customer_data': orjson.loads(row['customer_data']),
             'churn_probability': row['churn_probability'],
             'risk_level': row['risk_level'],
             'will_churn': bool(row['will_churn']),
@@ -116,27 +216,29 @@ def get_prediction_stats() -> dict:
     conn = get_connection()
     cursor = conn.cursor()
 
-    # Total predictions
-    cursor.execute('SELECT COUNT(*) as total FROM predictions')
-    total = cursor.fetchone()['total']
-
-    # Churn rate
-    cursor.execute('SELECT AVG(will_churn) * 100 as churn_rate FROM predictions')
+    # Totals, churn rate, average probability and risk distribution in one pass
+    cursor.execute('''
+        SELECT COUNT(*) as total,
+               AVG(will_churn) * 100 as churn_rate,
+               AVG(churn_probability) as avg_prob,
+               SUM(risk_level = 'Low') as Low,
+               SUM(risk_level = 'Medium') as Medium,
+               SUM(risk_level = 'High') as High,
+               SUM(risk_level = 'Critical') as Critical
+        FROM predictions
+    ''')
     result = cursor.fetchone()
-    churn_rate = round(result['churn_rate'], 2) if result['churn_rate'] else 0
 
-    # Average probability
-    cursor.execute('SELECT AVG(churn_probability) as avg_prob FROM predictions')
-    result = cursor.fetchone()
+    total = result['total']
+    churn_rate = round(result['churn_rate'], 2) if result['churn_rate'] else 0
     avg_probability = round(result['avg_prob'], 2) if result['avg_prob'] else 0
 
-    # Risk distribution
-    cursor.execute('''
-        SELECT risk_level, COUNT(*) as count
-        FROM predictions
-        GROUP BY risk_level
-    ''')
-    risk_dist = {row['risk_level']: row['count'] for row in cursor.fetchall()}
+    # Only levels that occur, like the old GROUP BY
+    risk_dist = {
+        level: result[level]
+        for level in ('Low', 'Medium', 'High', 'Critical')
+        if result[level]
+    }
 
     # Recent trend (last 7 days)
     cursor.execute('''
@@ -151,8 +253,6 @@ def get_prediction_stats() -> dict:
     trend = [{'date': row['date'], 'count': row['count'], 'avg_probability': round(row['avg_probability'], 2)}
              for row in cursor.fetchall()]
 
-    conn.close()
-
     return {
         'total_predictions': total,
         'overall_churn_rate': churn_rate,
@@ -170,9 +270,6 @@ def delete_prediction(prediction_id: int) -> bool:
     cursor.execute('DELETE FROM predictions WHERE id = ?', (prediction_id,))
     deleted = cursor.rowcount > 0
 
-    conn.commit()
-    conn.close()
-
     return deleted
 
 
@@ -181,13 +278,11 @@ def clear_history() -> int:
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute('SELECT COUNT(*) as count FROM predictions')
-    count = cursor.fetchone()['count']
-
-    cursor.execute('DELETE FROM predictions')
+    with _transaction(conn):
+        cursor.execute('SELECT COUNT(*) as count FROM predictions')
+        count = cursor.fetchone()['count']
 
-    conn.commit()
-    conn.close()
+        cursor.execute('DELETE FROM predictions')
 
     return count
 
@@ -3,27 +3,125 @@ Data loader for Telco Customer Churn dataset.
 This downloads the REAL dataset from IBM's GitHub.
 """
 
+import os
+import logging
+import urllib.request
+from typing import Optional
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
 
 # URL to the real Telco Customer Churn dataset
 DATASET_URL = "https://raw.githubusercontent.com/IBM/telco-customer-churn-on-icp4d/master/data/Telco-Customer-Churn.csv"
 
+# Local copy of the dataset (Parquet) and the ETag it was downloaded with
+CACHE_DIR = os.environ.get(
+    'CHURNSHIELD_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'churnshield')
+)
+CACHE_PATH = os.path.join(CACHE_DIR, 'telco.parquet')
+ETAG_PATH = os.path.join(CACHE_DIR, 'etag.txt')
+
+# The download is parsed in 256 KB blocks. Types are inferred from the
+# first block, so TotalCharges (blank for a few rows) is pinned to string
+DOWNLOAD_READ_OPTIONS = pacsv.ReadOptions(block_size=256 * 1024)
+DOWNLOAD_CONVERT_OPTIONS = pacsv.ConvertOptions(column_types={'TotalCharges': pa.string()})
+
+# Text columns that are not categories (every other text column is
+# dictionary-encoded in the cache)
+PLAIN_TEXT_COLUMNS = ('customerID', 'TotalCharges')
+
+
+def get_remote_etag() -> Optional[str]:
+    """
+    Ask the server for the dataset's ETag (or Last-Modified) without
+    downloading it. Returns None when offline or the header is missing.
+    """
+    try:
+        request = urllib.request.Request(DATASET_URL, method='HEAD')
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.headers.get('ETag') or response.headers.get('Last-Modified')
+    except OSError:
+        return None
+
+
+def _to_pandas(table: pa.Table) -> pd.DataFrame:
+    """
+    Convert to pandas: dictionary columns become categoricals, the rest
+    stay Arrow-backed (strings in one contiguous buffer instead of a
+    Python object per cell).
+    """
+    return table.to_pandas(
+        types_mapper=lambda t: None if pa.types.is_dictionary(t) else pd.ArrowDtype(t)
+    )
+
 
 def load_telco_data() -> pd.DataFrame:
     """
-    Download and load the Telco Customer Churn dataset.
+    Load the Telco Customer Churn dataset.
+
+    Downloads it once and keeps a Parquet copy in CACHE_DIR; later calls
+    read the local copy unless the upstream file changed (ETag differs).
 
     Returns:
         DataFrame with customer data
     """
-    print("Downloading Telco Customer Churn dataset...")
-    print(f"URL: {DATASET_URL}")
-
-    # pandas can read directly from URL!
-    df = pd.read_csv(DATASET_URL)
-
-    print(f"Downloaded {len(df)} customer records")
-    print(f"Columns: {list(df.columns)}")
+    remote_etag = get_remote_etag()
+    cached_etag = None
+    if os.path.exists(ETAG_PATH):
+        with open(ETAG_PATH) as f:
+            cached_etag = f.read().strip() or None
+
+    # Use the cache if it is current (or we can't check because we're offline)
+    if os.path.exists(CACHE_PATH) and (remote_etag is None or remote_etag == cached_etag):
+        logger.info("Loading cached Telco Customer Churn dataset from %s", CACHE_PATH)
+        df = _to_pandas(pq.read_table(CACHE_PATH))
+        logger.info("Loaded %d customer records", len(df))
+        return df
+
+    logger.info("Downloading Telco Customer Churn dataset...")
+    logger.info("URL: %s", DATASET_URL)
+
+    # Stream the response into Arrow's incremental CSV reader, so parsing
+    # each block overlaps with downloading the next one
+    batches = []
+    rows = 0
+    with urllib.request.urlopen(DATASET_URL, timeout=60) as response:
+        reader = pacsv.open_csv(
+            response,
+            read_options=DOWNLOAD_READ_OPTIONS,
+            convert_options=DOWNLOAD_CONVERT_OPTIONS
+        )
+        for batch in reader:
+            batches.append(batch)
+            rows += batch.num_rows
+            logger.debug("  ...%d rows", rows)
+        table = pa.Table.from_batches(batches, schema=reader.schema)
+
+    # Categorical text columns -> dictionary arrays (a few distinct strings
+    # plus small integer indices per row)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_string(field.type) and field.name not in PLAIN_TEXT_COLUMNS:
+            table = table.set_column(i, field.name, pc.dictionary_encode(table.column(i)))
+
+    df = _to_pandas(table)
+
+    logger.info("Downloaded %d customer records", len(df))
+    logger.debug("Columns: %s", list(df.columns))
+
+    # Save the local copy (write to a temp file first so readers never
+    # see a half-written cache)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = CACHE_PATH + '.tmp'
+    pq.write_table(table, tmp_path, compression='zstd', compression_level=3)
+    os.replace(tmp_path, CACHE_PATH)
+    with open(ETAG_PATH, 'w') as f:
+        f.write(remote_etag or '')
 
     return df
 
@@ -33,9 +131,8 @@ def prepare_data(df: pd.DataFrame) -> pd.DataFrame:
     Clean and prepare the data for training.
 
     What we do:
-    1. Remove customerID (not useful for prediction)
+    1. Select key features for our simple model (drops customerID)
     2. Fix TotalCharges (has some blank values)
-    3. Select key features for our simple model
 
     Args:
         df: Raw dataframe
@@ -43,16 +140,6 @@ def prepare_data(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         Cleaned dataframe ready for training
     """
-    # Make a copy
-    df = df.copy()
-
-    # TotalCharges has some blank strings - convert to numeric
-    # Blank values become NaN (Not a Number)
-    df['TotalCharges'] = pd.to_numeric(df['TotalCharges'], errors='coerce')
-
-    # Drop rows with missing TotalCharges (only 11 rows)
-    df = df.dropna(subset=['TotalCharges'])
-
     # IMPROVED: Using more features for better predictions
     # More features = model can learn more patterns
     key_features = [
@@ -81,10 +168,37 @@ def prepare_data(df: pd.DataFrame) -> pd.DataFrame:
         'Churn'             # Did they leave? (Yes/No)
     ]
 
-    df = df[key_features]
+    # Copy only the columns we keep (the raw frame has 21)
+    df = df[key_features].copy()
 
-    print(f"\nPrepared data shape: {df.shape}")
-    print(f"Churn distribution:\n{df['Churn'].value_counts()}")
+    # TotalCharges has some blank strings - convert to numeric with Arrow's
+    # compute kernels. Blank values become null (Arrow float64 column)
+    total_charges = pc.cast(pa.array(df['TotalCharges']), pa.string())
+    total_charges = pc.utf8_trim_whitespace(total_charges)
+    total_charges = pc.if_else(pc.equal(total_charges, ''), None, total_charges)
+    df['TotalCharges'] = pd.Series(
+        pd.arrays.ArrowExtensionArray(pc.cast(total_charges, pa.float64(), safe=False)),
+        index=df.index
+    )
+
+    # Drop rows with missing TotalCharges (only 11 rows)
+    df.dropna(subset=['TotalCharges'], inplace=True)
+
+    # Text columns -> category dtype: each value is stored once and rows
+    # hold small integer codes, which train() uses directly
+    df = df.astype({
+        column: 'category'
+        for column in df.columns
+        if not pd.api.types.is_numeric_dtype(df[column])
+    })
+
+    # Class balance, counted once and kept with the frame for train()
+    df.attrs['churn_counts'] = {
+        str(label): int(count) for label, count in df['Churn'].value_counts().items()
+    }
+
+    logger.info("Prepared data shape: %s", df.shape)
+    logger.info("Churn distribution: %s", df.attrs['churn_counts'])
 
     return df
 
@@ -94,6 +208,8 @@ def prepare_data(df: pd.DataFrame) -> pd.DataFrame:
 # ============================================================
 
 if __name__ == "__main__":
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'))
+
     # Load data
     raw_data = load_telco_data()
 
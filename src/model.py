@@ -8,14 +8,90 @@ XGBoost vs RandomForest:
 - XGBoost usually gives better accuracy!
 """
 
+import os
+import json
+import time
+import logging
+import functools
+import threading
+from typing import List, Optional, Union
 import pandas as pd
 import numpy as np
-from xgboost import XGBClassifier
-from sklearn.model_selection import train_test_split
+from xgboost import Booster, XGBClassifier
+from sklearn.base import clone
+from sklearn.model_selection import StratifiedShuffleSplit
 from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import accuracy_score, classification_report
 import joblib
 
+logger = logging.getLogger(__name__)
+
+# Serve predictions from a Treelite-compiled shared library instead of
+# XGBoost's Python predictor (needs the optional treelite + tl2cgen packages)
+USE_TREELITE = os.environ.get('USE_TREELITE') == '1'
+
+# Files written by ChurnModel.save(path): path + MODEL_SUFFIX holds the
+# trees (XGBoost UBJSON), path + META_SUFFIX the encoders and metrics
+MODEL_SUFFIX = '.ubj'
+META_SUFFIX = '.meta.json'
+
+# CPUs this process may run on (respects container/cgroup CPU pinning,
+# unlike os.cpu_count); training uses all of them
+TRAIN_THREADS = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+
+# Batches of at least this many rows are scored on a separate booster
+# handle with ChurnModel(batch_threads=...) OpenMP threads, when above 1
+BATCH_THREADING_MIN_ROWS = 1000
+
+# Number of distinct customers whose single predictions are memoized
+PREDICTION_CACHE_SIZE = 10_000
+
+
+# Risk levels by churn probability: < 25% Low, < 50% Medium, < 75% High,
+# else Critical. RISK_BUCKET_BY_PERCENT maps each whole percent (0-100)
+# to its index in RISK_LEVELS
+RISK_LEVELS = np.array(['Low', 'Medium', 'High', 'Critical'])
+RISK_BUCKET_BY_PERCENT = np.searchsorted([25, 50, 75], np.arange(101), side='right').astype(np.uint8)
+_RISK_LEVEL_BY_PERCENT = RISK_LEVELS[RISK_BUCKET_BY_PERCENT].tolist()
+
+
+def get_encoder_categories(encoder) -> list:
+    """
+    Category values in code order for a stored encoder.
+
+    Older model files hold sklearn LabelEncoders; newer ones store the
+    categories as a pandas Index.
+    """
+    if isinstance(encoder, LabelEncoder):
+        return list(encoder.classes_)
+    return list(encoder)
+
+
+def _sort_categories(values: pd.Series) -> pd.Series:
+    """
+    Put a categorical column's categories in lexical order.
+    factorize(sort=True) orders a categorical by its categories, and the
+    codes must match a LabelEncoder's (sorted values).
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.reorder_categories(sorted(values.cat.categories))
+    return values
+
+
+def get_risk_buckets(probabilities: np.ndarray) -> np.ndarray:
+    """
+    Risk level index (into RISK_LEVELS) for an array of churn
+    probabilities (0-1): one table lookup per value by whole percent,
+    no comparisons. Same thresholds as ChurnModel.predict.
+    """
+    percents = np.clip((probabilities.astype(np.float64) * 100).astype(np.intp), 0, 100)
+    return RISK_BUCKET_BY_PERCENT[percents]
+
+
+def get_risk_levels(probabilities: np.ndarray) -> np.ndarray:
+    """Vectorized risk level names for an array of churn probabilities (0-1)."""
+    return RISK_LEVELS[get_risk_buckets(probabilities)]
+
 
 class ChurnModel:
     """
@@ -27,20 +103,25 @@ class ChurnModel:
     3. Returns probability (0-100%) and risk level
     """
 
-    def __init__(self):
+    def __init__(self, batch_threads: int = 1):
         # XGBoost classifier - more powerful than RandomForest
         # Key parameters explained:
         # - n_estimators: Number of boosting rounds (trees)
         # - max_depth: How deep each tree can be (prevents overfitting)
         # - learning_rate: How much to adjust weights (smaller = more careful)
+        # - tree_method/max_bin: Bucket each feature into 256 bins so split
+        #   finding scans histograms instead of sorted values
         # - eval_metric: What to optimize (logloss for classification)
+        # - n_jobs: Training threads (predictions use 1, see _build_lookups)
         self.model = XGBClassifier(
             n_estimators=100,
             max_depth=5,
             learning_rate=0.1,
+            tree_method='hist',
+            max_bin=256,
             eval_metric='logloss',
-            random_state=42,
-            use_label_encoder=False
+            n_jobs=TRAIN_THREADS,
+            random_state=42
         )
 
         # Encoders to convert text to numbers
@@ -51,6 +132,35 @@ class ChurnModel:
         self.metrics = {}
         self.feature_names = []
 
+        # Threads for batches of BATCH_THREADING_MIN_ROWS or more
+        # (single rows and smaller batches always use one)
+        self.batch_threads = batch_threads
+
+        # Sorted category arrays for vectorized encoding and per-column
+        # value -> code dicts for single rows (built after train/load)
+        self._booster = None
+        self._batch_booster = None
+        self._cat_values = {}
+        self._cat_maps = {}
+        self._row_maps = []
+
+        # Feature positions split by kind, fixed once trained
+        self._num_columns = []
+        self._num_positions = []
+        self._cat_columns = []
+
+        # Compiled Treelite predictor (see enable_treelite)
+        self._predictor = None
+
+        # Feature importance is fixed once trained, so compute it once
+        self._feature_importance = {}
+
+        # One (1, n_features) float32 row per thread for single predictions
+        self._row_buffers = threading.local()
+
+        # Memoized single predictions, keyed by the tuple of feature values
+        self._cache = functools.lru_cache(maxsize=PREDICTION_CACHE_SIZE)(self._predict_uncached)
+
     def train(self, data: pd.DataFrame):
         """
         Train the model on historical customer data.
@@ -60,6 +170,8 @@ class ChurnModel:
             data: DataFrame with customer features and 'Churn' column
         """
         df = data.copy()
+        self._predictor = None  # compiled library would be stale
+        self.clear_cache()
 
         # Separate features (X) and target (y)
         X = df.drop('Churn', axis=1)
@@ -68,20 +180,29 @@ class ChurnModel:
         # Store feature names for later
         self.feature_names = list(X.columns)
 
-        # Convert text columns to numbers
-        for column in X.select_dtypes(include=['object']).columns:
-            self.encoders[column] = LabelEncoder()
-            X[column] = self.encoders[column].fit_transform(X[column])
+        # Convert text columns to numbers with one hash-table pass per
+        # column (sorted, so the codes match what a LabelEncoder gives)
+        for column in X.columns:
+            if not pd.api.types.is_numeric_dtype(X[column]):
+                codes, uniques = pd.factorize(_sort_categories(X[column]), sort=True)
+                self.encoders[column] = pd.Index(uniques.to_numpy(dtype=object))
+                X[column] = codes.astype(np.int32)
+
+        # One C-contiguous float32 matrix for XGBoost (also covers Arrow dtypes)
+        X = X.to_numpy(dtype=np.float32)
 
         # Encode target
-        self.encoders['Churn'] = LabelEncoder()
-        y = self.encoders['Churn'].fit_transform(y)
+        codes, uniques = pd.factorize(_sort_categories(y), sort=True)
+        self.encoders['Churn'] = pd.Index(uniques.to_numpy(dtype=object))
+        y = codes.astype(np.int32)
 
         # Split data: 80% train, 20% test
         # This lets us measure how well the model performs on unseen data!
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42, stratify=y
-        )
+        # (stratified split by row index, so no DataFrame copies)
+        splitter = StratifiedShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
+        train_idx, test_idx = next(splitter.split(X, y))
+        X_train, X_test = X[train_idx], X[test_idx]
+        y_train, y_test = y[train_idx], y[test_idx]
 
         # Train the model
         self.model.fit(X_train, y_train)
@@ -90,18 +211,27 @@ class ChurnModel:
         y_pred = self.model.predict(X_test)
         accuracy = accuracy_score(y_test, y_pred)
 
+        # Class balance from prepare_data, or counted from the codes
+        churn_counts = data.attrs.get('churn_counts') or {
+            str(label): int(count)
+            for label, count in zip(self.encoders['Churn'], np.bincount(y))
+        }
+
         # Store metrics
         self.metrics = {
             'accuracy': round(accuracy * 100, 2),
             'train_samples': len(X_train),
             'test_samples': len(X_test),
-            'total_samples': len(df)
+            'total_samples': len(df),
+            'churn_counts': churn_counts
         }
 
         self.is_trained = True
+        self._build_lookups()
+        self._feature_importance = self._compute_feature_importance()
 
-        print(f"Model trained on {len(X_train)} samples")
-        print(f"Test accuracy: {self.metrics['accuracy']}%")
+        logger.info("Model trained on %d samples", len(X_train))
+        logger.info("Test accuracy: %s%%", self.metrics['accuracy'])
 
         return self
 
@@ -118,27 +248,45 @@ class ChurnModel:
         if not self.is_trained:
             raise ValueError("Model not trained! Call train() first.")
 
-        # Convert dict to DataFrame
-        df = pd.DataFrame([customer_data])
+        return self.predict_values(tuple(customer_data[name] for name in self.feature_names))
 
-        # Encode text columns using same encoders from training
-        for column in df.select_dtypes(include=['object']).columns:
-            if column in self.encoders:
-                df[column] = self.encoders[column].transform(df[column])
+    def predict_values(self, values: tuple) -> dict:
+        """
+        Predict churn for a single customer given its feature values
+        in feature_names order (skips building a dict first).
+        """
+        if not self.is_trained:
+            raise ValueError("Model not trained! Call train() first.")
+
+        # Identical customers hit the cache and skip the booster entirely.
+        # Charges are scored to the cent (as in encode_batch), so customers
+        # that differ below a cent share an entry and the same result
+        key = tuple(float(np.round(value, 2)) if type(value) is float else value for value in values)
+        return dict(self._cache(key))
+
+    def _predict_uncached(self, key: tuple) -> dict:
+        """Run the model for one customer given its feature values in order."""
+        # Encode in plain Python (one dict lookup per categorical feature),
+        # then copy the row into this thread's reusable buffer - no
+        # one-row DataFrame and no new array per request
+        encoded = []
+        for column, mapping, value in zip(self.feature_names, self._row_maps, key):
+            if mapping is None:
+                encoded.append(value)
+            elif value in mapping:
+                encoded.append(mapping[value])
+            else:
+                raise ValueError(f"Unknown values for {column}: {[str(value)]}")
+        row = getattr(self._row_buffers, 'row', None)
+        if row is None or row.shape[1] != len(encoded):
+            row = self._row_buffers.row = np.empty((1, len(encoded)), dtype=np.float32)
+        row[0] = encoded
 
         # Get prediction probability
-        proba = self.model.predict_proba(df)[0]
-        churn_probability = proba[1]
-
-        # Determine risk level
-        if churn_probability < 0.25:
-            risk_level = "Low"
-        elif churn_probability < 0.50:
-            risk_level = "Medium"
-        elif churn_probability < 0.75:
-            risk_level = "High"
-        else:
-            risk_level = "Critical"
+        churn_probability = float(self._predict_proba(row)[0])
+
+        # Determine risk level (same lookup table as get_risk_levels)
+        risk_level = _RISK_LEVEL_BY_PERCENT[int(churn_probability * 100)]
 
         return {
             "churn_probability": round(churn_probability * 100, 2),
@@ -146,46 +294,271 @@ class ChurnModel:
             "will_churn": churn_probability >= 0.5
         }
 
+    def predict_batch(self, df: Union[pd.DataFrame, List[dict]]) -> np.ndarray:
+        """
+        Predict churn for many customers in one call.
+
+        Encodes every categorical column at once and runs a single
+        inplace_predict over the whole matrix instead of one call per row.
+
+        Args:
+            df: DataFrame with one row per customer (all feature columns),
+                or a list of customer dicts
+
+        Returns:
+            Array of churn probabilities (0-1), one per row
+        """
+        if not self.is_trained:
+            raise ValueError("Model not trained! Call train() first.")
+
+        return self._predict_proba(self.encode_batch(df))
+
+    def encode_batch(self, df: Union[pd.DataFrame, List[dict]]) -> np.ndarray:
+        """
+        Encode customers into the model's float32 feature matrix.
+
+        Categorical columns are encoded with one binary search per column
+        over its sorted category array (codes are positions in that array).
+
+        Raises:
+            ValueError: if a categorical column has a value not seen in training
+        """
+        if not isinstance(df, pd.DataFrame):
+            df = pd.DataFrame.from_records(df, columns=self.feature_names)
+
+        # Fill a C-contiguous float32 matrix column by column: XGBoost uses
+        # float32 internally, so this is what it would copy the data to anyway
+        values = np.empty((len(df), len(self.feature_names)), dtype=np.float32)
+
+        # Numeric columns in one copy (charges rounded to the cent, as for
+        # single predictions), then each categorical column
+        values[:, self._num_positions] = np.round(df[self._num_columns].to_numpy(dtype=np.float64), 2)
+
+        for i, column in self._cat_columns:
+            categories = self._cat_values[column]
+
+            # Insertion points are the codes; a value that is not at its
+            # insertion point was never seen in training
+            raw = df[column].to_numpy(dtype=str)
+            codes = categories.searchsorted(raw)
+            unknown = categories[np.minimum(codes, len(categories) - 1)] != raw
+            if unknown.any():
+                raise ValueError(f"Unknown values for {column}: {sorted(set(raw[unknown].tolist()))}")
+            values[:, i] = codes
+
+        return values
+
+    def _predict_proba(self, values: np.ndarray) -> np.ndarray:
+        """Churn probabilities for an encoded float32 feature matrix."""
+        if self._predictor is not None:
+            import tl2cgen
+            return self._predictor.predict(tl2cgen.DMatrix(values)).reshape(-1)
+        if self._batch_booster is not None and len(values) >= BATCH_THREADING_MIN_ROWS:
+            return self._batch_booster.inplace_predict(values)
+        return self._booster.inplace_predict(values)
+
+    def enable_treelite(self, libpath: str, rebuild: bool = False):
+        """
+        Compile the trained trees to a native shared library with Treelite
+        and use it for all predictions.
+
+        The generated C code walks each tree with plain branches, which
+        avoids XGBoost's per-call DMatrix and dispatch overhead.
+
+        Args:
+            libpath: Where the compiled library (.so) lives
+            rebuild: Recompile even if libpath already exists
+        """
+        import tl2cgen
+
+        if rebuild or not os.path.exists(libpath):
+            self._compile_treelite(libpath)
+
+        self._predictor = tl2cgen.Predictor(libpath)
+        return self
+
+    def _compile_treelite(self, libpath: str):
+        """
+        Compile the trees to libpath, once across processes.
+
+        Every API worker may ask for the same library at startup: the
+        first one to take the lock file compiles, the others wait and
+        then reuse what it wrote. The library is written next to libpath
+        and moved into place, so it is never loaded half-written.
+        """
+        import fcntl
+        import treelite
+        import tl2cgen
+
+        started = time.time()
+        with open(libpath + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if os.path.exists(libpath) and os.path.getmtime(libpath) >= started:
+                return  # compiled by another process while we waited
+
+            root, ext = os.path.splitext(libpath)
+            tmp_path = root + '.tmp' + ext
+            tl_model = treelite.frontend.from_xgboost(self._booster)
+            tl2cgen.export_lib(
+                tl_model,
+                toolchain='gcc',
+                libpath=tmp_path,
+                # quantize: compare integer bin indices of the thresholds
+                # instead of floats
+                params={'parallel_comp': 32, 'quantize': 1}
+            )
+            os.replace(tmp_path, libpath)
+            logger.info("Compiled Treelite library to %s", libpath)
+
+    def _build_lookups(self, booster: Optional[Booster] = None):
+        """
+        Cache the booster and category lookup tables for vectorized predict.
+        Uses the fitted classifier's booster unless one is given.
+        """
+        self._booster = booster if booster is not None else self.model.get_booster()
+        # Named features let get_score report importance by column name
+        self._booster.feature_names = list(self.feature_names)
+        # One thread per prediction; the API scales out with worker processes.
+        # Big batches get their own copy that spreads rows over batch_threads
+        self._booster.set_param({'nthread': 1})
+        self._batch_booster = None
+        if self.batch_threads > 1:
+            self._batch_booster = self._booster.copy()
+            self._batch_booster.set_param({'nthread': self.batch_threads})
+        # Categories are stored sorted, so position == code
+        self._cat_values = {
+            column: np.array(get_encoder_categories(encoder), dtype=str)
+            for column, encoder in self.encoders.items()
+            if column in self.feature_names
+        }
+        # Codes stored as floats, ready for the float32 row
+        self._cat_maps = {
+            column: {value: float(code) for code, value in enumerate(categories.tolist())}
+            for column, categories in self._cat_values.items()
+        }
+        self._row_maps = [self._cat_maps.get(column) for column in self.feature_names]
+        self._cat_columns = [
+            (i, column) for i, column in enumerate(self.feature_names)
+            if column in self._cat_values
+        ]
+        self._num_columns = [
+            column for column in self.feature_names if column not in self._cat_values
+        ]
+        self._num_positions = [self.feature_names.index(column) for column in self._num_columns]
+
+    def clear_cache(self):
+        """Forget memoized single predictions."""
+        self._cache.cache_clear()
+
     def get_feature_importance(self) -> dict:
         """
         Get which features are most important for predictions.
         This helps understand what drives churn!
         """
-        if not self.is_trained:
-            return {}
-
-        importance = self.model.feature_importances_
-        feature_importance = dict(zip(self.feature_names, importance))
+        return self._feature_importance
+
+    def _compute_feature_importance(self) -> dict:
+        """Feature importance (share of total gain) in percent, highest first."""
+        # Same numbers as feature_importances_, read straight off the booster
+        scores = self._booster.get_score(importance_type='gain')
+        total = sum(scores.values()) or 1.0
+        feature_importance = {
+            name: scores.get(name, 0.0) / total for name in self.feature_names
+        }
 
         # Sort by importance (highest first)
         sorted_importance = dict(
             sorted(feature_importance.items(), key=lambda x: x[1], reverse=True)
         )
 
-        return {k: round(v * 100, 2) for k, v in sorted_importance.items()}
+        return {k: round(float(v) * 100, 2) for k, v in sorted_importance.items()}
 
     def save(self, filepath: str):
-        """Save model to disk."""
-        joblib.dump({
-            'model': self.model,
-            'encoders': self.encoders,
+        """
+        Save model to disk.
+
+        The trees go to filepath + '.ubj' in XGBoost's native binary
+        format; encoders, metrics and feature names go to a small JSON
+        sidecar (filepath + '.meta.json').
+        """
+        self._booster.save_model(filepath + MODEL_SUFFIX)
+        meta = {
+            'encoders': {
+                column: [str(value) for value in get_encoder_categories(encoder)]
+                for column, encoder in self.encoders.items()
+            },
             'is_trained': self.is_trained,
             'metrics': self.metrics,
             'feature_names': self.feature_names
-        }, filepath)
-        print(f"Model saved to {filepath}")
+        }
+        with open(filepath + META_SUFFIX, 'w') as f:
+            json.dump(meta, f, indent=2)
+        logger.info("Model saved to %s%s", filepath, MODEL_SUFFIX)
 
     def load(self, filepath: str):
-        """Load model from disk."""
+        """
+        Load model from disk (the path given to save()).
+        A path ending in .joblib loads an older pickled model file.
+        """
+        if filepath.endswith('.joblib'):
+            return self._load_joblib(filepath)
+
+        # A bare Booster is all prediction needs: no sklearn wrapper to
+        # rebuild from the saved config. self.model goes back to unfitted
+        # (same parameters) for a later train()
+        booster = Booster(model_file=filepath + MODEL_SUFFIX)
+        self.model = clone(self.model)
+        with open(filepath + META_SUFFIX) as f:
+            meta = json.load(f)
+        self.encoders = {
+            column: pd.Index(categories, dtype=object)
+            for column, categories in meta['encoders'].items()
+        }
+        self.is_trained = meta['is_trained']
+        self.metrics = meta.get('metrics', {})
+        self.feature_names = meta.get('feature_names', [])
+        self._after_load(booster)
+        logger.info("Model loaded from %s%s", filepath, MODEL_SUFFIX)
+        return self
+
+    def _load_joblib(self, filepath: str):
+        """Load a model pickled with joblib by earlier versions."""
         data = joblib.load(filepath)
         self.model = data['model']
         self.encoders = data['encoders']
         self.is_trained = data['is_trained']
         self.metrics = data.get('metrics', {})
         self.feature_names = data.get('feature_names', [])
-        print(f"Model loaded from {filepath}")
+        self._after_load()
+        logger.info("Model loaded from %s", filepath)
         return self
 
+    def _after_load(self, booster: Optional[Booster] = None):
+        """Reset per-model state once a model has been loaded."""
+        self._predictor = None
+        self.clear_cache()
+        self._feature_importance = {}
+        if self.is_trained:
+            self._build_lookups(booster)
+            self._feature_importance = self._compute_feature_importance()
+
+
+# Model of a /predict/batch worker process (see init_batch_worker)
+_worker_model: Optional[ChurnModel] = None
+
+
+def init_batch_worker(model_path: str, lib_path: Optional[str]):
+    """Load the model once in each batch worker process."""
+    global _worker_model
+    _worker_model = ChurnModel().load(model_path)
+    if lib_path:
+        _worker_model.enable_treelite(lib_path)
+
+
+def predict_in_batch_worker(features: pd.DataFrame) -> np.ndarray:
+    """Score one chunk in a batch worker process."""
+    return _worker_model.predict_batch(features)
+
 
 # ============================================================
 # DEMO: Test the improved model
@@ -194,6 +567,8 @@ class ChurnModel:
 if __name__ == "__main__":
     from load_data import load_telco_data, prepare_data
 
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'))
+
     # Load data
     print("Loading Telco Customer Churn data...")
     raw_data = load_telco_data()
@@ -306,3 +306,310 @@ def test_history_stats_endpoint():
     assert "total_predictions" in data
     assert "overall_churn_rate" in data
     assert "risk_distribution" in data
+
+
+# ============================================================
+# Test 14: Batch predictions are saved to history
+# ============================================================
+def test_batch_prediction_saved_to_history():
+    """Test batch predictions are written to history in one bulk insert."""
+    csv_content = """customerID,tenure,Contract,PaymentMethod,MonthlyCharges,TotalCharges
+H001,2,Month-to-month,Electronic check,89.50,179.00
+H002,60,Two year,Bank transfer (automatic),45.00,2700.00"""
+
+    response = client.post(
+        "/predict/batch",
+        files={"file": ("test.csv", io.BytesIO(csv_content.encode()), "text/csv")}
+    )
+    assert response.status_code == 200
+
+    history = client.get("/history", params={"limit": 50}).json()
+    saved_ids = {
+        item["customer_id"] for item in history["predictions"]
+        if item["prediction_type"] == "batch"
+    }
+    assert {"H001", "H002"} <= saved_ids
+
+
+# ============================================================
+# Test 15: Repeated predictions and cache clearing
+# ============================================================
+def test_predict_cache_and_clear():
+    """Test repeated payloads are served from the cache and the cache can be cleared."""
+    customer = {
+        "tenure": 3,
+        "Contract": "Month-to-month",
+        "PaymentMethod": "Electronic check",
+        "MonthlyCharges": 80.00,
+        "TotalCharges": 240.00
+    }
+
+    first = client.post("/predict", json=customer).json()
+    hits = _model._cache.cache_info().hits
+    second = client.post("/predict", json=customer).json()
+    assert second == first
+    assert _model._cache.cache_info().hits == hits + 1
+
+    response = client.post("/cache/clear")
+    assert response.status_code == 200
+    assert _model._cache.cache_info().currsize == 0
+
+    third = client.post("/predict", json=customer).json()
+    assert third == first
+    assert _model._cache.cache_info().currsize == 1
+
+
+# ============================================================
+# Test 16: Keyset pagination of history
+# ============================================================
+def test_history_keyset_pagination():
+    """Test before_id returns the page that follows the given item."""
+    customers = [
+        {
+            "tenure": tenure,
+            "Contract": "One year",
+            "PaymentMethod": "Credit card (automatic)",
+            "MonthlyCharges": 60.00,
+            "TotalCharges": 60.00 * tenure
+        }
+        for tenure in range(1, 5)
+    ]
+    response = client.post("/predict/batch/json", json=customers)
+    assert response.status_code == 200
+
+    first_page = client.get("/history", params={"limit": 2}).json()["predictions"]
+    assert len(first_page) == 2
+
+    response = client.get("/history", params={"limit": 2, "before_id": first_page[-1]["id"]})
+    assert response.status_code == 200
+
+    next_page = response.json()["predictions"]
+    assert len(next_page) == 2
+    first_ids = {item["id"] for item in first_page}
+    assert all(item["id"] not in first_ids for item in next_page)
+
+    # An anchor that does not exist is an error, not an empty page
+    missing_id = max(item["id"] for item in first_page) + 1000000
+    response = client.get("/history", params={"limit": 2, "before_id": missing_id})
+    assert response.status_code == 404
+
+
+# ============================================================
+# Test 17: float32 batch inference matches float64
+# ============================================================
+def test_predict_batch_float32_matches_float64():
+    """Test the float32 batch path gives the same probabilities as float64 input."""
+    import numpy as np
+
+    features = _training_data.drop('Churn', axis=1).head(200)
+
+    # Baseline: label-encode (sorted categories) and predict on float64
+    encoded = features.copy()
+    for column in encoded.select_dtypes(exclude='number').columns:
+        categories = sorted(_training_data[column].unique())
+        encoded[column] = encoded[column].astype(object).map({v: i for i, v in enumerate(categories)})
+    expected = _model.model.predict_proba(encoded.astype('float64'))[:, 1]
+
+    np.testing.assert_allclose(_model.predict_batch(features), expected, atol=1e-6)
+
+
+# ============================================================
+# Test 18: Batch prediction from a JSON list
+# ============================================================
+def test_batch_prediction_json():
+    """Test JSON batch predictions match single predictions."""
+    customers = [
+        {
+            "tenure": 2,
+            "Contract": "Month-to-month",
+            "PaymentMethod": "Electronic check",
+            "MonthlyCharges": 95.00,
+            "TotalCharges": 190.00
+        },
+        {
+            "tenure": 60,
+            "Contract": "Two year",
+            "PaymentMethod": "Bank transfer (automatic)",
+            "MonthlyCharges": 55.00,
+            "TotalCharges": 3300.00
+        }
+    ]
+
+    response = client.post("/predict/batch/json", json=customers)
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["total_customers"] == 2
+    assert [p["customer_id"] for p in data["predictions"]] == ["row_0", "row_1"]
+
+    for customer, prediction in zip(customers, data["predictions"]):
+        single = client.post("/predict", json=customer).json()
+        assert prediction["churn_probability"] == pytest.approx(single["churn_probability"], abs=0.01)
+        assert prediction["risk_level"] == single["risk_level"]
+
+
+# ============================================================
+# Test 19: Risk level lookup table matches the thresholds
+# ============================================================
+def test_risk_levels_match_thresholds():
+    """Test table-based risk bucketing at and around each threshold."""
+    import numpy as np
+    from model import get_risk_levels
+
+    probabilities = np.array([0.0, 0.2499, 0.25, 0.4999, 0.5, 0.7499, 0.75, 1.0], dtype=np.float32)
+    expected = ['Low', 'Low', 'Medium', 'Medium', 'High', 'High', 'Critical', 'Critical']
+
+    assert get_risk_levels(probabilities).tolist() == expected
+
+
+# ============================================================
+# Test 20: Unknown category values are rejected by validation
+# ============================================================
+def test_predict_unknown_category():
+    """Test that a category value the model never saw returns 422."""
+    customer = {
+        "tenure": 12,
+        "Contract": "Three year",
+        "PaymentMethod": "Electronic check",
+        "MonthlyCharges": 70.00,
+        "TotalCharges": 840.00
+    }
+
+    response = client.post("/predict", json=customer)
+    assert response.status_code == 422
+
+
+# ============================================================
+# Test 21: Single and batch predictions agree on sub-cent charges
+# ============================================================
+def test_predict_sub_cent_charge_matches_batch():
+    """Test /predict and the batch path score sub-cent charges the same, warm cache or not."""
+    # Two charges in the same cent on either side of a MonthlyCharges split
+    trees = _model._booster.trees_to_dataframe()
+    splits = trees.loc[trees["Feature"] == "MonthlyCharges", "Split"]
+    below, above = next(
+        ((float(s) - 0.004, float(s) + 0.004) for s in splits
+         if round(float(s) - 0.004, 2) == round(float(s) + 0.004, 2)),
+        (68.396, 68.404)
+    )
+    customers = [
+        {
+            "tenure": 5,
+            "Contract": "Month-to-month",
+            "PaymentMethod": "Electronic check",
+            "MonthlyCharges": monthly,
+            "TotalCharges": round(monthly * 5, 2)
+        }
+        for monthly in (below, above)
+    ]
+
+    client.post("/cache/clear")
+    first = client.post("/predict", json=customers[0]).json()
+    # Served from the entry the first request left in the cache
+    hits = _model._cache.cache_info().hits
+    second = client.post("/predict", json=customers[1]).json()
+    assert _model._cache.cache_info().hits == hits + 1
+
+    batch = client.post("/predict/batch/json", json=customers).json()["predictions"]
+    for single, prediction in zip((first, second), batch):
+        assert prediction["churn_probability"] == pytest.approx(single["churn_probability"], abs=1e-4)
+        assert prediction["risk_level"] == single["risk_level"]
+
+
+# ============================================================
+# Test 22: Saved model round-trips through the UBJ format
+# ============================================================
+def test_model_save_load_ubj(tmp_path):
+    """Test that a model saved as .ubj + .meta.json predicts identically after loading."""
+    import numpy as np
+
+    path = str(tmp_path / "churn_model")
+    _model.save(path)
+    assert os.path.exists(path + ".ubj")
+    assert os.path.exists(path + ".meta.json")
+
+    loaded = ChurnModel().load(path)
+    assert loaded.feature_names == _model.feature_names
+
+    sample = _training_data.head(200)
+    np.testing.assert_array_equal(loaded.predict_batch(sample), _model.predict_batch(sample))
+
+
+# ============================================================
+# Test 23: Per-thread database connections close with their thread
+# ============================================================
+def test_thread_connection_closed_when_thread_ends():
+    """Test a connection opened by a worker thread is closed once the thread is gone."""
+    import gc
+    import sqlite3
+    import threading
+    from database import get_connection
+
+    connections = []
+    thread = threading.Thread(target=lambda: connections.append(get_connection()))
+    thread.start()
+    thread.join()
+    del thread
+    gc.collect()
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        connections[0].execute('SELECT 1')
+
+
+# ============================================================
+# Test 24: Queued /predict history reaches the database
+# ============================================================
+def test_history_writer_flushes_queued_predictions(monkeypatch):
+    """Test the background writer saves /predict history, on its deadline and at shutdown."""
+    import time
+
+    # Flush after every 2 records so one run covers full and partial groups
+    monkeypatch.setattr(api_module, "HISTORY_FLUSH_SIZE", 2)
+
+    def customer(monthly):
+        return {
+            "tenure": 7,
+            "Contract": "One year",
+            "PaymentMethod": "Mailed check",
+            "MonthlyCharges": monthly,
+            "TotalCharges": round(monthly * 7, 2)
+        }
+
+    def saved_charges():
+        history = client.get("/history", params={"limit": 20}).json()["predictions"]
+        return {item["customer_data"]["MonthlyCharges"] for item in history}
+
+    with TestClient(app) as live_client:
+        assert live_client.post("/predict", json=customer(11.11)).status_code == 200
+
+        # A lone record is written once the flush deadline passes
+        deadline = time.monotonic() + 5
+        while 11.11 not in saved_charges() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert 11.11 in saved_charges()
+
+        charges = [11.12, 11.13, 11.14, 11.15, 11.16]
+        for monthly in charges:
+            assert live_client.post("/predict", json=customer(monthly)).status_code == 200
+
+    # Shutdown drains the queue before the writer stops
+    assert set(charges) <= saved_charges()
+
+
+# ============================================================
+# Test 25: Threaded batch booster only when batch_threads > 1
+# ============================================================
+def test_batch_threads_booster(tmp_path):
+    """Test the threaded batch booster is skipped at one thread and predicts the same otherwise."""
+    import numpy as np
+    from model import BATCH_THREADING_MIN_ROWS
+
+    assert _model._batch_booster is None
+
+    path = str(tmp_path / "churn_model")
+    _model.save(path)
+    threaded = ChurnModel(batch_threads=2).load(path)
+    assert threaded._batch_booster is not None
+
+    sample = _training_data.head(BATCH_THREADING_MIN_ROWS)
+    np.testing.assert_array_equal(threaded.predict_batch(sample), _model.predict_batch(sample))
@@ -2,12 +2,15 @@
 Offline model training script.
 Run this once to train and save the model.
 """
+import logging
 import sys
 sys.path.insert(0, 'src')
 
 from model import ChurnModel
 from load_data import load_telco_data, prepare_data
 
+logging.basicConfig(level=logging.INFO)
+
 print("=" * 50)
 print("ChurnShield AI - Offline Model Training")
 print("=" * 50)
@@ -24,9 +27,9 @@ model = ChurnModel()
 model.train(training_data)
 
 # Save model
-model.save("src/churn_model.joblib")
+model.save("src/churn_model")
 
 print("\n" + "=" * 50)
-print("Model saved to src/churn_model.joblib")
-print("Commit and push this file to deploy!")
+print("Model saved to src/churn_model.ubj (+ churn_model.meta.json)")
+print("Commit and push these files to deploy!")
 print("=" * 50)